@@ -0,0 +1,126 @@
+"""
+Checks arsenal_scraper against the fixture pages in fixtures/, served from a local HTTP server.
+
+The fixtures are trimmed fbref match log pages (3 matches per season, one page per tab) built from rows of
+arsenal_opponent_data.csv, so the scraped data can be compared against the saved data. The server answers
+conditional requests with 304 when a page is unchanged, and can hide matches to simulate a match being played.
+
+Run from the arsenal_project directory:
+    python check_scraper.py
+"""
+import hashlib
+import os
+import re
+import tempfile
+import threading
+from collections import Counter
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from arsenal_scraper import Fetcher, HtmlCache, get_grouped_tables, update_csv
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+SAVED_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "arsenal_opponent_data.csv")
+TABS = ['passing', 'shooting', 'passing_types', 'gca', 'defense', 'possession', 'misc']
+COMMON_KEYS = ['date', 'start_time', 'round', 'dayofweek', 'venue', 'result', 'goals_for', 'goals_against', 'opponent']
+TODAY = date(2024, 1, 15)  # 2022/23 is completed, 2023/24 is in progress
+
+
+class FixtureServer(ThreadingHTTPServer):
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), FixtureHandler)
+        self.hidden_dates = set()  # matches left out of every page, as if they had not been played yet
+        self.responses = Counter()  # status code -> number of responses
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # URLs look like /<season>/<tab>/Arsenal-Match-Logs-Premier-League
+        parts = self.path.strip("/").split("/")
+        path = os.path.join(FIXTURES, parts[0] + "_" + parts[1] + ".html") if len(parts) >= 2 else ""
+        if not os.path.exists(path):
+            self.reply(404)
+            return
+        with open(path, encoding="utf-8") as file:
+            page = file.read()
+        for hidden in self.server.hidden_dates:
+            page = re.sub(r"<tr><th[^>]*><a[^>]*>" + hidden + r"</a></th>.*?</tr>\n", "", page)
+        body = page.encode()
+        etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.reply(304)
+            return
+        self.reply(200, body, {"ETag": etag, "Content-Type": "text/html; charset=utf-8"})
+
+    def reply(self, status, body=b"", headers=None):
+        self.server.responses[status] += 1
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def expected_rows(dates):
+    saved_df = pd.read_csv(SAVED_CSV)
+    return saved_df[saved_df['date'].isin(dates)].reset_index(drop=True)
+
+
+def check_matches_saved_data(csv_path, dates):
+    scraped_df = pd.read_csv(csv_path)
+    saved_df = expected_rows(dates)
+    assert list(scraped_df.columns) == list(saved_df.columns), "columns differ from arsenal_opponent_data.csv"
+    pd.testing.assert_frame_equal(scraped_df.sort_values('date').reset_index(drop=True), saved_df,
+                                  check_dtype=False)
+
+
+def main():
+    server = FixtureServer()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url_template = "http://127.0.0.1:{}/".format(server.server_port) + "{}/{}/Arsenal-Match-Logs-Premier-League"
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "arsenal_opponent_data.csv")
+        fetcher = Fetcher(HtmlCache(os.path.join(directory, "cache")), min_interval=0)
+        saved_df = pd.read_csv(SAVED_CSV)
+        dates_2022 = list(saved_df[saved_df['season'] == 2022]['date'][:3])
+        dates_2023 = list(saved_df[saved_df['season'] == 2023]['date'][:3])
+
+        # 1. empty cache: every page is downloaded (200), the last 2023/24 match has not been played yet
+        server.hidden_dates = {dates_2023[-1]}
+        df = update_csv(csv_path, fetcher, url_template, [2022, 2023], 'against', TABS, COMMON_KEYS, today=TODAY)
+        assert server.responses == {200: 14}, server.responses
+        assert len(df) == 5, len(df)
+        check_matches_saved_data(csv_path, dates_2022 + dates_2023[:-1])
+
+        # 2. completed season: served from the cache without any request
+        server.responses.clear()
+        df = get_grouped_tables(fetcher, url_template, [2022], 'against', TABS, COMMON_KEYS, today=TODAY)
+        assert not server.responses, server.responses
+        assert list(df['date']) == dates_2022, list(df['date'])
+
+        # 3. nothing changed: the completed season is not requested, the current season is revalidated (304)
+        df = update_csv(csv_path, fetcher, url_template, [2022, 2023], 'against', TABS, COMMON_KEYS, today=TODAY)
+        assert server.responses == {304: 7}, server.responses
+        assert len(df) == 5, len(df)
+
+        # 4. a new match is played: the current season is downloaded again (200) and only the new match is appended
+        server.responses.clear()
+        server.hidden_dates = set()
+        df = update_csv(csv_path, fetcher, url_template, [2022, 2023], 'against', TABS, COMMON_KEYS, today=TODAY)
+        assert server.responses == {200: 7}, server.responses
+        assert len(df) == 6, len(df)
+        check_matches_saved_data(csv_path, dates_2022 + dates_2023)
+
+    server.shutdown()
+    print("OK: scraped fixture pages match arsenal_opponent_data.csv (200, 304 and incremental update checked)")
+
+
+if __name__ == '__main__':
+    main()
@@ -87,7 +87,6 @@ class GameState():
     def undo_move(self):
         if len(self.move_log) != 0:
             move = self.move_log.pop()
-            print("INDS", move.start_row, move.end_row)
             self.board[move.start_row][move.start_col] = move.piece_moved
             self.board[move.end_row][move.end_col] = move.piece_captured
             self.white_to_move = not self.white_to_move
@@ -99,17 +98,11 @@ class GameState():
 
             # undo enpassant
             if move.enpassant and move.piece_captured != " ": # only if capture occurs
-                print("YAYAYAYAYA EN PASSANT")
-                print(move.piece_captured)
-                print(move.piece_moved)
-                print(move.start_row, move.start_col)
-                print(move.end_row, move.end_col)
                 self.board[move.end_row][move.end_col] = " " # reset landing square to blank
                 self.board[move.start_row][move.end_col] = move.piece_captured
                 self.enpassant_possible = (move.end_row, move.end_col)
 
             # undo two square pawn advance
-            print("NEXT:", move.piece_moved, move.start_row, move.end_row)
             if move.piece_moved[1] == "P" and abs(move.start_row - move.end_row) == 2:
                 self.enpassant_possible = ()
 
@@ -132,22 +125,34 @@ class GameState():
         if move.piece_moved == "wK":
             self.current_castling_rights.wks = False
             self.current_castling_rights.wqs = False
-        elif move.piece_moved[1] == "wR":
+        elif move.piece_moved == "wR":
             if move.start_row == 7:
                 if move.start_col == 0:
                     self.current_castling_rights.wqs = False
                 elif move.start_col == 7:
                     self.current_castling_rights.wks = False
-        elif move.piece_moved[0] == "bK":
+        elif move.piece_moved == "bK":
             self.current_castling_rights.bks = False
             self.current_castling_rights.bqs = False
-        elif move.piece_moved[1] == "bR":
+        elif move.piece_moved == "bR":
             if move.start_row == 0:
                 if move.start_col == 0:
                     self.current_castling_rights.bqs = False
                 elif move.start_col == 7:
                     self.current_castling_rights.bks = False
 
+        # rook captured on its starting square
+        if move.piece_captured == "wR" and move.end_row == 7:
+            if move.end_col == 0:
+                self.current_castling_rights.wqs = False
+            elif move.end_col == 7:
+                self.current_castling_rights.wks = False
+        elif move.piece_captured == "bR" and move.end_row == 0:
+            if move.end_col == 0:
+                self.current_castling_rights.bqs = False
+            elif move.end_col == 7:
+                self.current_castling_rights.bks = False
+
     """
     get all moves considering checks
     """
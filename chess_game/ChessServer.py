@@ -0,0 +1,416 @@
+"""
+Headless server that hosts many games at once over a local socket. Moves are sent in the form given by
+Move.get_chess_notation (e.g. "e2e4", with an optional promotion piece: "e7e8Q").
+
+Legal moves are stored in a process-wide cache keyed by position, so games that reach the same position
+(openings especially) share one call to get_valid_moves. Validating a move against a cached position is a
+dictionary lookup; positions that are not cached yet are generated in a process pool. MOVE replies as soon as the
+move is applied, and the legal moves of the new position are generated in the background. Only a command that
+needs them (the next MOVE, MOVES or STATUS) waits, and only if they are not ready yet.
+
+Protocol: one command per line, one reply per line ("OK ..." or "ERR ...")
+    NEW                     -> OK <game_id>
+    MOVE <game_id> <move>   -> OK
+    MOVES <game_id>         -> OK <move> <move> ...     (no moves once the game is over)
+    STATUS <game_id>        -> OK <ongoing|checkmate|stalemate>
+    END <game_id>           -> OK
+    STATS                   -> OK games=<n> positions=<n> hits=<n> misses=<n>
+    LATENCY                 -> OK cached n=<n> p50=<ms> p99=<ms> generated n=<n> p50=<ms> p99=<ms>
+
+LATENCY reports how long MOVE/MOVES/STATUS took inside the server, split by whether the legal moves of the position
+were already cached when the command arrived or had to be generated (or waited for) first.
+
+Run from the repository root:
+    python -m chess_game.ChessServer serve --port 8765
+    python -m chess_game.ChessServer load --port 8765 --games 1000 --moves 12
+"""
+
+import argparse
+import asyncio
+import itertools
+import random
+import sys
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from chess_game import ChessEngine
+
+ENPASSANT = 1
+CASTLE = 2
+PROMOTION_PIECES = ("Q", "R", "B", "N")
+LATENCY_SAMPLES = 100000  # latencies kept per kind for LATENCY, so memory does not grow with the number of moves
+
+"""
+Legal moves of a position, shared by every game that reaches it
+"""
+
+
+class CachedPosition():
+    __slots__ = ("moves", "status")
+
+    def __init__(self, moves, status):
+        self.moves = moves  # dict: chess notation -> ENPASSANT/CASTLE flags
+        self.status = status  # "ongoing", "checkmate" or "stalemate"
+
+
+"""
+everything that affects move generation, used both as the cache key and to rebuild the position in a worker process
+"""
+
+
+def position_key(gs):
+    rights = gs.current_castling_rights
+    return (gs.board.tobytes(), gs.white_to_move, rights.wks, rights.wqs, rights.bks, rights.bqs,
+            gs.enpassant_possible, gs.white_king_location, gs.black_king_location)
+
+
+def compute_position(key):
+    board, white_to_move, wks, wqs, bks, bqs, enpassant_possible, white_king, black_king = key
+    gs = ChessEngine.GameState()
+    gs.board = np.frombuffer(board, dtype=gs.board.dtype).reshape(gs.board.shape).copy()
+    gs.white_to_move = white_to_move
+    gs.current_castling_rights = ChessEngine.CastlingRights(wks, wqs, bks, bqs)
+    gs.enpassant_possible = enpassant_possible
+    gs.white_king_location = white_king
+    gs.black_king_location = black_king
+
+    moves = {}
+    for move in gs.get_valid_moves():
+        flags = (ENPASSANT if move.enpassant else 0) | (CASTLE if move.is_castle else 0)
+        moves[move.get_chess_notation()] = flags
+    status = "checkmate" if gs.checkmate else "stalemate" if gs.stalemate else "ongoing"
+    return CachedPosition(moves, status)
+
+
+"""
+Process-wide least recently used cache of legal moves. Positions that are not cached are computed in a process pool,
+so the event loop keeps answering cache hits while they are generated
+"""
+
+
+class LegalMoveCache():
+    def __init__(self, max_positions=20000, processes=None):
+        self.max_positions = max_positions
+        self.processes = processes  # None uses one process per core, 0 computes positions in the event loop
+        self.positions = OrderedDict()
+        self.pending = {}  # key -> future, so concurrent requests for the same position share one computation
+        self.pool = None
+        self.hits = 0
+        self.misses = 0
+
+    """
+    returns the cached legal moves of a position without waiting, or None if they are not cached yet
+    """
+
+    def lookup(self, gs):
+        key = position_key(gs)
+        position = self.positions.get(key)
+        if position is not None:
+            self.hits += 1
+            self.positions.move_to_end(key)
+        return position
+
+    async def get(self, gs):
+        position = self.lookup(gs)
+        if position is not None:
+            return position
+        key = position_key(gs)
+        if key in self.pending:
+            self.hits += 1
+            return await asyncio.shield(self.pending[key])
+
+        self.misses += 1
+        if self.processes == 0:
+            return self.store(key, compute_position(key))
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers=self.processes)
+        try:
+            future = asyncio.get_running_loop().run_in_executor(self.pool, compute_position, key)
+        except BrokenProcessPool:
+            self.reset_pool()
+            raise
+        # the result is stored when the computation finishes, even if every game waiting for it has ended
+        self.pending[key] = future
+        future.add_done_callback(lambda future: self.computed(key, future))
+        return await asyncio.shield(future)
+
+    def computed(self, key, future):
+        del self.pending[key]
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            if isinstance(future.exception(), BrokenProcessPool):
+                self.reset_pool()  # a worker died, start a new pool for the next position
+            return
+        self.store(key, future.result())
+
+    def store(self, key, position):
+        # intern the notation so the same string is shared across all cached positions
+        position.moves = {sys.intern(notation): flags for notation, flags in position.moves.items()}
+        self.positions[key] = position
+        if len(self.positions) > self.max_positions:
+            self.positions.popitem(last=False)  # drop least recently used position
+        return position
+
+    def reset_pool(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+            self.pool = None
+
+
+"""
+A single hosted game. Keeps a reference to the (shared) cached legal moves of its current position, or the pending
+future while they are generated
+"""
+
+
+class HostedGame():
+    __slots__ = ("gs", "position", "pending")
+
+    def __init__(self):
+        self.gs = ChessEngine.GameState()
+        self.position = None
+        self.pending = None
+
+    """
+    validates and makes a move given in chess notation, returns False if the move is not legal
+    """
+
+    def make_move(self, notation):
+        promotion = None
+        if len(notation) == 5:  # e.g. "e7e8Q"
+            notation, promotion = notation[:4], notation[4].upper()
+            if promotion not in PROMOTION_PIECES:
+                return False
+        flags = self.position.moves.get(notation)
+        if flags is None:
+            return False
+        start = (ChessEngine.Move.ranks_to_rows[notation[1]], ChessEngine.Move.files_to_cols[notation[0]])
+        end = (ChessEngine.Move.ranks_to_rows[notation[3]], ChessEngine.Move.files_to_cols[notation[2]])
+        move = ChessEngine.Move(start, end, self.gs.board, is_enpassant=bool(flags & ENPASSANT),
+                                is_castle=bool(flags & CASTLE))
+        if promotion is not None and not move.pawn_promotion:
+            return False
+        self.gs.make_move(move, choice=(promotion or "Q") if move.pawn_promotion else None)
+        # moves are never undone on the server, so only the current castling rights need to be kept
+        self.gs.move_log.clear()
+        del self.gs.castling_rights_log[:-1]
+        self.position = None
+        return True
+
+
+class ChessServer():
+    def __init__(self, cache=None):
+        self.cache = cache if cache is not None else LegalMoveCache()
+        self.games = {}
+        self.game_ids = itertools.count(1)
+        self.latencies = {"cached": deque(maxlen=LATENCY_SAMPLES), "generated": deque(maxlen=LATENCY_SAMPLES)}
+
+    """
+    looks up the legal moves of the game's current position, or starts generating them in the background
+    """
+
+    def schedule_position(self, game):
+        game.position = self.cache.lookup(game.gs)
+        if game.position is None:
+            game.pending = asyncio.ensure_future(self.cache.get(game.gs))
+
+    """
+    returns the legal moves of the game's current position, waiting for them if they are still being generated.
+    If generating them failed, the game keeps its position and they are generated again on the next call
+    """
+
+    async def current_position(self, game):
+        if game.position is None:
+            if game.pending is None:
+                self.schedule_position(game)
+                if game.position is not None:
+                    return game.position
+            pending = game.pending
+            try:
+                game.position = await asyncio.shield(pending)
+            finally:
+                if game.pending is pending:
+                    game.pending = None
+        return game.position
+
+    """
+    handle a single command line, returns the reply line
+    """
+
+    async def handle_command(self, line):
+        parts = line.split()
+        if not parts:
+            return "ERR empty command"
+        command = parts[0].upper()
+        if command == "NEW":
+            game_id = str(next(self.game_ids))
+            game = HostedGame()
+            self.schedule_position(game)
+            self.games[game_id] = game
+            return "OK " + game_id
+        if command == "STATS":
+            return "OK games={} positions={} hits={} misses={}".format(
+                len(self.games), len(self.cache.positions), self.cache.hits, self.cache.misses)
+        if command == "LATENCY":
+            return "OK " + " ".join("{} n={} {}".format(kind, len(samples), format_percentiles(samples, (0.5, 0.99)))
+                                    for kind, samples in self.latencies.items())
+        if len(parts) < 2 or parts[1] not in self.games:
+            return "ERR unknown game"
+        game = self.games[parts[1]]
+        if command == "END":
+            if game.pending is not None and not game.pending.cancel():
+                game.pending.exception()  # already finished, so a failure is not reported as never retrieved
+            del self.games[parts[1]]
+            return "OK"
+        if command not in ("MOVE", "MOVES", "STATUS") or (command == "MOVE") != (len(parts) == 3):
+            return "ERR unknown command"
+        start = time.perf_counter()
+        samples = self.latencies["cached" if game.position is not None else "generated"]
+        reply = await self.game_command(command, parts, game)
+        samples.append(time.perf_counter() - start)
+        return reply
+
+    """
+    handle MOVE, MOVES or STATUS for an existing game, returns the reply line
+    """
+
+    async def game_command(self, command, parts, game):
+        try:
+            position = await self.current_position(game)
+        except asyncio.CancelledError:
+            if parts[1] in self.games:
+                raise
+            return "ERR game ended"
+        except Exception as e:
+            return "ERR could not generate legal moves: " + type(e).__name__
+        if command == "MOVE":
+            if position.status != "ongoing":
+                return "ERR game over: " + position.status
+            if not game.make_move(parts[2]):
+                return "ERR illegal move"
+            self.schedule_position(game)
+            return "OK"
+        if command == "MOVES":
+            return "OK " + " ".join(position.moves)
+        return "OK " + position.status
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    reply = await self.handle_command(line.decode())
+                except UnicodeDecodeError:
+                    reply = "ERR invalid encoding"
+                writer.write((reply + "\n").encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8765):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if self.cache.pool is not None:
+                self.cache.pool.shutdown(cancel_futures=True)
+
+
+def format_percentiles(latencies, quantiles=(0.5, 0.9, 0.99)):
+    latencies = sorted(latencies)
+    if not latencies:
+        return " ".join("p{}=-".format(int(q * 100)) for q in quantiles)
+    return " ".join("p{}={:.3f}ms".format(int(q * 100), latencies[int(q * (len(latencies) - 1))] * 1000)
+                    for q in quantiles)
+
+
+"""
+Local load generator: plays many concurrent games and reports latency as seen by the client. A ply is MOVES (which
+waits if the position is still being generated) followed by MOVE. For the first opening_plies moves each game picks
+one of the first opening_width legal moves (so games share openings), then plays randomly
+"""
+
+
+async def play_games(host, port, n_games, n_moves, seed, opening_plies, opening_width):
+    reader, writer = await asyncio.open_connection(host, port)
+    rng = random.Random(seed)
+    latencies = {"ply": [], "MOVES": [], "MOVE": []}
+
+    async def request(command):
+        writer.write((command + "\n").encode())
+        await writer.drain()
+        return (await reader.readline()).decode().split()
+
+    for _ in range(n_games):
+        game_id = (await request("NEW"))[1]
+        for ply in range(n_moves):
+            start = time.perf_counter()
+            moves = (await request("MOVES " + game_id))[1:]  # waits if the position is still being generated
+            moves_done = time.perf_counter()
+            latencies["MOVES"].append(moves_done - start)
+            if not moves:
+                break
+            if ply < opening_plies:
+                moves = sorted(moves)[:opening_width]
+            reply = await request("MOVE " + game_id + " " + rng.choice(moves))
+            latencies["MOVE"].append(time.perf_counter() - moves_done)
+            latencies["ply"].append(time.perf_counter() - start)
+            if reply[0] != "OK":
+                break
+        await request("END " + game_id)
+    writer.close()
+    return latencies
+
+
+async def load_test(host="127.0.0.1", port=8765, games=1000, moves=12, connections=50, opening_plies=8,
+                    opening_width=3):
+    start = time.perf_counter()
+    per_connection = max(1, games // connections)
+    results = await asyncio.gather(*(play_games(host, port, per_connection, moves, seed, opening_plies, opening_width)
+                                     for seed in range(connections)))
+    elapsed = time.perf_counter() - start
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(b"STATS\nLATENCY\n")
+    stats = (await reader.readline()).decode().strip()
+    server_latency = (await reader.readline()).decode().strip()
+    writer.close()
+
+    n_moves = sum(len(result["MOVE"]) for result in results)
+    print("{} moves in {:.2f}s ({:.0f} moves/s)".format(n_moves, elapsed, n_moves / elapsed))
+    for kind in ("ply", "MOVES", "MOVE"):
+        print("client {}: {}".format(kind, format_percentiles(itertools.chain.from_iterable(
+            result[kind] for result in results))))
+    print("server", server_latency[3:])
+    print(stats)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless multi-game chess server")
+    parser.add_argument("mode", choices=["serve", "load"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--games", type=int, default=1000)
+    parser.add_argument("--moves", type=int, default=12)
+    parser.add_argument("--connections", type=int, default=50)
+    parser.add_argument("--opening-plies", type=int, default=8)
+    parser.add_argument("--opening-width", type=int, default=3)
+    args = parser.parse_args()
+    if args.mode == "serve":
+        asyncio.run(ChessServer().serve(args.host, args.port))
+    else:
+        asyncio.run(load_test(args.host, args.port, args.games, args.moves, args.connections, args.opening_plies,
+                              args.opening_width))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,228 @@
+"""
+Streaming parsers for HMMER (hmmsearch) and BLAST (tabular, -outfmt 7) search output files.
+
+Each parser reads the file line by line and yields one typed record per hit, so memory use does not grow with
+the size of the hit table. Records can be collected into columns for a pandas DataFrame, or written to a
+Parquet file in batches.
+"""
+from operator import attrgetter
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+HMMER_COLUMNS = {  # record field -> column name used in the notebook DataFrames
+    "evalue_full": "E-value (fs)",
+    "score_full": "Score (fs)",
+    "bias_full": "Bias (fs)",
+    "evalue_best": "E-value (best)",
+    "score_best": "Score (best)",
+    "bias_best": "Bias (best)",
+    "exp": "Exp",
+    "n": "N",
+    "sequence": "Sequence",
+    "description": "Description",
+    "included": "Included",  # False for hits below the inclusion threshold (include_below_threshold=True)
+}
+
+BLAST_COLUMNS = {
+    "query": "Query ID",
+    "subject": "Protein ID",
+    "query_length": "Query length",
+    "subject_length": "Length",
+    "identity": "% Identity",
+    "positives": "% Positives",
+    "alignment_length": "Alignment length",
+    "query_start": "Query start",
+    "query_end": "Query end",
+    "subject_start": "Subject start",
+    "subject_end": "Subject end",
+    "evalue": "E-value",
+}
+
+
+class HmmerHit(NamedTuple):
+    evalue_full: float
+    score_full: float
+    bias_full: float
+    evalue_best: float
+    score_best: float
+    bias_best: float
+    exp: float
+    n: int
+    sequence: str
+    description: str
+    included: bool  # False for hits reported below the inclusion threshold
+
+
+class BlastHit(NamedTuple):
+    query: str
+    subject: str
+    query_length: int
+    subject_length: int
+    identity: float
+    positives: float
+    alignment_length: int
+    query_start: int
+    query_end: int
+    subject_start: int
+    subject_end: int
+    evalue: float
+
+
+def parse_hmmer(file_name: str, max_evalue: Optional[float] = None,
+                include_below_threshold: bool = False) -> Iterator[HmmerHit]:
+    """
+    Yields the per-sequence hits of an hmmsearch output file in a single pass.
+
+    Arguments:
+    file_name (str): Path to the hmmsearch output file (e.g. 'cat.out').
+    max_evalue (float): If given, only hits with a full sequence E-value <= max_evalue are yielded.
+    include_below_threshold (bool): Also yield hits reported below the inclusion threshold (default is False).
+
+    Returns:
+    Iterator[HmmerHit]: One record per hit, in the order they appear in the file.
+    """
+    in_table = False  # True while reading the rows of a hit table
+    skip_query = False  # True once the rest of the current query's hit table can be ignored
+    with open(file_name) as file:
+        for line in file:
+            if not in_table:
+                if line.startswith("Query:"):
+                    skip_query = False
+                # the hit table starts after the dashed line underneath the column headers
+                elif line.lstrip().startswith("------- ------") and not skip_query:
+                    in_table = True
+                    included = True
+                continue
+
+            fields = line.split(maxsplit=9)
+            if not fields or fields[0].startswith("[No"):  # blank line or '[No hits detected...]' ends the table
+                in_table = False
+                continue
+            if fields[0] == "------":  # '------ inclusion threshold ------'
+                if not include_below_threshold:
+                    in_table = False
+                    skip_query = True
+                included = False
+                continue
+
+            evalue_full = float(fields[0])
+            if max_evalue is not None and evalue_full > max_evalue:
+                # hits are ranked by score, so no later hit in this table can pass the filter
+                in_table = False
+                skip_query = True
+                continue
+
+            yield HmmerHit(evalue_full, float(fields[1]), float(fields[2]), float(fields[3]), float(fields[4]),
+                           float(fields[5]), float(fields[6]), int(fields[7]), fields[8],
+                           fields[9].rstrip() if len(fields) > 9 else "", included)
+
+
+def parse_blast_tabular(file_name: str, max_evalue: Optional[float] = None) -> Iterator[BlastHit]:
+    """
+    Yields the hits of a BLAST tabular output file (-outfmt 7, default fields) in a single pass.
+
+    Arguments:
+    file_name (str): Path to the BLAST output file (e.g. 'detected_olfactory_blast.txt').
+    max_evalue (float): If given, only hits with an E-value <= max_evalue are yielded.
+
+    Returns:
+    Iterator[BlastHit]: One record per hit, in the order they appear in the file.
+    """
+    with open(file_name) as file:
+        for line in file:
+            if line.startswith("#") or not line.strip():  # comment lines hold the query/database/field names
+                continue
+            fields = line.rstrip("\n").split("\t")
+            evalue = float(fields[11])
+            if max_evalue is not None and evalue > max_evalue:
+                continue
+            yield BlastHit(fields[0], fields[1], int(fields[2]), int(fields[3]), float(fields[4]),
+                           float(fields[5]), int(fields[6]), int(fields[7]), int(fields[8]), int(fields[9]),
+                           int(fields[10]), evalue)
+
+
+_ARROW_TYPES = {float: "float64", int: "int64", str: "string", bool: "bool"}
+
+
+def arrow_schema(columns: Dict[str, str]):
+    """
+    Builds a fixed Arrow schema for the output columns from the field types of HmmerHit and BlastHit.
+
+    Arguments:
+    columns (dict): Maps record field names to output column names (e.g. HMMER_COLUMNS).
+
+    Returns:
+    pa.Schema: One field per output column, in the order of columns.
+    """
+    import pyarrow as pa
+
+    field_types = {**HmmerHit.__annotations__, **BlastHit.__annotations__}
+    return pa.schema([(name, pa.type_for_alias(_ARROW_TYPES[field_types[field]])) for field, name in columns.items()])
+
+
+def to_columns(records: Iterable[NamedTuple], columns: Dict[str, str]) -> Dict[str, list]:
+    """
+    Collects records into one list per column in a single pass.
+
+    Arguments:
+    records (Iterable[NamedTuple]): Records from parse_hmmer or parse_blast_tabular.
+    columns (dict): Maps record field names to output column names (e.g. HMMER_COLUMNS).
+
+    Returns:
+    dict: A dictionary with the output column names as keys and lists of values as values.
+    """
+    data: Dict[str, List] = {name: [] for name in columns.values()}
+    getters = [(attrgetter(field), data[name].append) for field, name in columns.items()]
+    for record in records:
+        for get, append in getters:
+            append(get(record))
+    return data
+
+
+def to_dataframe(records: Iterable[NamedTuple], columns: Dict[str, str]):
+    """
+    Builds a pandas DataFrame from parsed records.
+
+    Arguments:
+    records (Iterable[NamedTuple]): Records from parse_hmmer or parse_blast_tabular.
+    columns (dict): Maps record field names to DataFrame column names (e.g. HMMER_COLUMNS).
+
+    Returns:
+    pd.DataFrame: One row per record.
+    """
+    import pandas as pd
+
+    return pd.DataFrame(to_columns(records, columns), columns=list(columns.values()))
+
+
+def write_parquet(records: Iterable[NamedTuple], columns: Dict[str, str], file_name: str,
+                  batch_size: int = 100_000) -> int:
+    """
+    Writes parsed records to a Parquet file, holding at most batch_size records in memory at a time. Every batch is
+    written with the same schema, built from the record field types (see arrow_schema).
+
+    Arguments:
+    records (Iterable[NamedTuple]): Records from parse_hmmer or parse_blast_tabular.
+    columns (dict): Maps record field names to Parquet column names (e.g. HMMER_COLUMNS).
+    file_name (str): Path of the Parquet file to write.
+    batch_size (int): Number of records per row group (default is 100,000).
+
+    Returns:
+    int: The number of records written.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = arrow_schema(columns)
+    count = 0
+    batch = []
+    with pq.ParquetWriter(file_name, schema) as writer:
+        for record in records:
+            batch.append(record)
+            if len(batch) == batch_size:
+                writer.write_table(pa.table(to_columns(batch, columns), schema=schema))
+                count += len(batch)
+                batch = []
+        if batch or count == 0:  # write the remainder (or an empty table if there were no records)
+            writer.write_table(pa.table(to_columns(batch, columns), schema=schema))
+            count += len(batch)
+    return count
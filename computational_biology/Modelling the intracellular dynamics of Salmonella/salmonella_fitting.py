@@ -0,0 +1,294 @@
+"""
+Model solutions and parameter fitting for the intracellular Salmonella models.
+
+The system dM/dt = QM is linear, so its solution is M(t) = exp(Qt)M(0) and can be evaluated with a matrix
+exponential instead of numerical integration. Stationary distributions are cached per parameter set, and
+multi-start fits, profile likelihood intervals and bootstrap intervals can be run across a shared process pool.
+"""
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Callable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.linalg import expm
+from scipy.optimize import OptimizeResult, minimize
+from scipy.special import gammaln
+from scipy.stats import chi2, poisson
+
+
+class OdeSolution(NamedTuple):
+    t: np.ndarray  # time points
+    y: np.ndarray  # y[i] holds M_i at each time point
+
+
+def dyn_mat(alpha, mu, beta) -> np.ndarray:
+    """
+    Builds the matrix of transition rates Q, where dM/dt = QM.
+
+    Arguments:
+    alpha (array): Bacterial division rates alpha_i, with alpha_0 = 0.
+    mu (array): Lysis rates mu_i.
+    beta (array): Burst sizes beta_i.
+
+    Returns:
+    np.ndarray: The N x N matrix Q, where N = len(alpha).
+    """
+    alpha = np.asarray(alpha, dtype=float)
+    mu = np.asarray(mu, dtype=float)
+    beta = np.asarray(beta, dtype=float)
+    N = len(alpha)
+    i = np.arange(N)
+    Q = np.zeros(shape=(N, N))
+    Q[1, 1:] = beta[1:] * mu[1:]  # dM_1/dt gains a cell for every bacterium released by a burst
+    Q[i[2:], i[2:] - 1] = (i[2:] - 1) * alpha[1:-1]
+    Q[i[2:], i[2:]] = -(i[2:] * alpha[2:] + mu[2:])
+    Q[1, 1] = -(alpha[1] + mu[1]) + beta[1] * mu[1]
+    return Q
+
+
+@lru_cache(maxsize=256)
+def _step_matrix(alpha: Tuple[float, ...], mu: Tuple[float, ...], beta: Tuple[float, ...], dt: float) -> np.ndarray:
+    # exp(Q dt) is reused for every time step, and across calls with the same parameters
+    step = expm(dyn_mat(alpha, mu, beta) * dt)
+    step.flags.writeable = False
+    return step
+
+
+def ode_sol(alpha, mu, beta, M_0, max_time: int) -> OdeSolution:
+    """
+    Solves dM/dt = QM at the integer times 0, 1, ..., max_time using the matrix exponential of Q.
+
+    Arguments:
+    alpha (array): Bacterial division rates alpha_i, with alpha_0 = 0.
+    mu (array): Lysis rates mu_i.
+    beta (array): Burst sizes beta_i.
+    M_0 (array): Number of cells infected with i bacteria at t = 0.
+    max_time (int): Last time point of the solution.
+
+    Returns:
+    OdeSolution: Time points in .t and the solution M_i(t) in .y, matching the output of solve_ivp.
+    """
+    times = np.linspace(0, max_time, max_time + 1)
+    step = _step_matrix(tuple(map(float, alpha)), tuple(map(float, mu)), tuple(map(float, beta)), 1.0)
+    y = np.empty(shape=(len(M_0), len(times)))
+    y[:, 0] = M_0
+    for j in range(1, len(times)):
+        y[:, j] = step @ y[:, j - 1]
+    return OdeSolution(times, y)
+
+
+@lru_cache(maxsize=4096)
+def stat_B(delta: float, N: int) -> np.ndarray:
+    """
+    Stationary distribution of Model B with a constant bursting probability delta.
+
+    Arguments:
+    delta (float): Probability of a cell bursting at each bacterial division (for 0 < i < N).
+    N (int): Maximum number of bacteria in a cell.
+
+    Returns:
+    np.ndarray: pi_i for 0 <= i <= N, with pi_0 = 0.
+    """
+    i = np.arange(1, N + 1)
+    Bs = delta * (1 - delta) ** (i - 1)
+    Bs[-1] = (1 - delta) ** (N - 1)  # delta_N = 1
+    pi_values = np.concatenate(([0.0], (1 - np.cumsum(Bs)) / (i * (i + 1))))
+    pi_values = pi_values / np.sum(pi_values)
+    pi_values.flags.writeable = False  # cached arrays are shared between callers
+    return pi_values
+
+
+@lru_cache(maxsize=4096)
+def pois_model(lam: float, N: int) -> np.ndarray:
+    """
+    Stationary distribution of Model C, where lysis sizes follow a truncated Poisson distribution.
+
+    Arguments:
+    lam (float): Mean lysis size lambda.
+    N (int): Maximum number of bacteria in a cell.
+
+    Returns:
+    np.ndarray: pi_i for 0 <= i < N, with pi_0 = 0.
+    """
+    n = np.arange(1, N)
+    B_n = poisson.pmf(n, lam)
+    pi_values = np.concatenate(([0.0], (1 - np.cumsum(B_n)) / (n * (n + 1))))
+    pi_values = pi_values / np.sum(pi_values)
+    pi_values.flags.writeable = False
+    return pi_values
+
+
+def log_lik(pi, obs) -> float:
+    """
+    Multinomial log likelihood of the observed counts given a distribution pi.
+
+    Arguments:
+    pi (array): Probability that a cell contains n bacteria, starting from n = 1.
+    obs (array): Number of cells observed to contain n bacteria, starting from n = 1.
+
+    Returns:
+    float: The log likelihood (only the first len(pi) observations contribute to the product).
+    """
+    obs = np.asarray(obs)
+    X = np.sum(obs)
+    X_n = obs[:len(pi)]
+    return float(gammaln(X + 1) + np.sum(X_n * np.log(pi[:len(X_n)]) - gammaln(X_n + 1)))
+
+
+def neg_log_lik(params, model: Callable, N: int, obs) -> float:
+    """
+    Negative log likelihood of a one-parameter stationary model, for use with minimize.
+
+    Arguments:
+    params (array): Parameter value in params[0] (e.g. delta for stat_B, lambda for pois_model).
+    model (Callable): Function returning the stationary distribution, called as model(param, N).
+    N (int): Maximum number of bacteria in a cell.
+    obs (array): Number of cells observed to contain n bacteria, starting from n = 1.
+
+    Returns:
+    float: The negative log likelihood.
+    """
+    pi_values = model(float(params[0]), N)[1:len(obs) + 1]
+    return -log_lik(pi_values, obs)
+
+
+def _fit_one(start: float, model: Callable, N: int, obs: Tuple[int, ...]) -> OptimizeResult:
+    return minimize(neg_log_lik, [start], args=(model, N, obs), method='Nelder-Mead')
+
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_WORKERS = 0
+
+
+def get_pool(processes: Optional[int] = None) -> ProcessPoolExecutor:
+    """
+    Returns the module-level process pool, creating it on first use. The pool is reused by every call, so worker
+    processes (and their numpy/scipy imports) are only started once per session.
+
+    Arguments:
+    processes (int): Number of worker processes (default is one per core). A pool of a different size replaces
+                     the existing one.
+
+    Returns:
+    ProcessPoolExecutor: The shared pool.
+    """
+    global _POOL, _POOL_WORKERS
+    workers = processes or os.cpu_count() or 1
+    if _POOL is not None and _POOL_WORKERS != workers:
+        _POOL.shutdown()
+        _POOL = None
+    if _POOL is None:
+        _POOL = ProcessPoolExecutor(max_workers=workers)
+        _POOL_WORKERS = workers
+    return _POOL
+
+
+def _map(func, *iterables, processes: Optional[int] = 1, executor: Optional[Executor] = None) -> list:
+    # processes=1 (the default) runs in the current process, which avoids the start-up cost for small jobs
+    if executor is None and processes == 1:
+        return list(map(func, *iterables))
+    if executor is None:
+        executor = get_pool(processes)
+    return list(executor.map(func, *iterables))
+
+
+def _workers(processes: Optional[int], executor: Optional[Executor]) -> int:
+    # number of chunks to split work into: the executor's size when one is given, otherwise the size of the pool
+    if executor is not None:
+        return getattr(executor, "_max_workers", None) or os.cpu_count() or 1
+    if processes == 1:
+        return 1
+    return processes or os.cpu_count() or 1
+
+
+def fit_multistart(model: Callable, obs, starts: Sequence[float], N: int = 100,
+                   processes: Optional[int] = 1, executor: Optional[Executor] = None) -> OptimizeResult:
+    """
+    Finds the maximum likelihood parameter by running Nelder-Mead from several starting values.
+
+    Arguments:
+    model (Callable): Function returning the stationary distribution (e.g. stat_B or pois_model).
+    obs (array): Number of cells observed to contain n bacteria, starting from n = 1.
+    starts (Sequence[float]): Starting values for the optimisation.
+    N (int): Maximum number of bacteria in a cell (default is 100).
+    processes (int): Number of worker processes (default is 1, which runs in the current process). Any other value,
+                     including None for one per core, uses the shared pool from get_pool.
+    executor (Executor): Executor to run the work on instead, e.g. one shared across several calls.
+
+    Returns:
+    OptimizeResult: The result with the lowest negative log likelihood.
+    """
+    obs = tuple(int(x) for x in obs)
+    n = len(starts)
+    results = _map(_fit_one, starts, [model] * n, [N] * n, [obs] * n, processes=processes, executor=executor)
+    return min(results, key=lambda result: result.fun)
+
+
+def _log_lik_grid(params: Sequence[float], model: Callable, N: int, obs: Tuple[int, ...]) -> List[float]:
+    return [log_lik(model(float(p), N)[1:len(obs) + 1], obs) for p in params]
+
+
+def profile_interval(model: Callable, obs, fit: OptimizeResult, grid: Sequence[float], N: int = 100,
+                     level: float = 0.95, processes: Optional[int] = 1,
+                     executor: Optional[Executor] = None) -> Tuple[float, float]:
+    """
+    Wilks' (profile likelihood) confidence interval, found by evaluating the log likelihood over a grid.
+
+    Arguments:
+    model (Callable): Function returning the stationary distribution (e.g. stat_B or pois_model).
+    obs (array): Number of cells observed to contain n bacteria, starting from n = 1.
+    fit (OptimizeResult): Maximum likelihood fit, e.g. from fit_multistart.
+    grid (Sequence[float]): Parameter values to evaluate.
+    N (int): Maximum number of bacteria in a cell (default is 100).
+    level (float): Confidence level (default is 0.95, a log likelihood drop of 1.92).
+    processes (int): Number of worker processes (default is 1, which runs in the current process). Any other value,
+                     including None for one per core, uses the shared pool from get_pool.
+    executor (Executor): Executor to run the work on instead, e.g. one shared across several calls. The grid is
+                         split into one chunk per worker of the executor, and processes is ignored.
+
+    Returns:
+    tuple: The smallest and largest grid values inside the interval.
+    """
+    obs = tuple(int(x) for x in obs)
+    threshold = -fit.fun - chi2.ppf(level, df=1) / 2
+    grid = list(grid)
+    workers = _workers(processes, executor)
+    chunks = [grid[k::workers] for k in range(workers)]  # one chunk per worker keeps pickling overhead low
+    n = len(chunks)
+    values = _map(_log_lik_grid, chunks, [model] * n, [N] * n, [obs] * n, processes=processes, executor=executor)
+    inside = [p for chunk, chunk_values in zip(chunks, values)
+              for p, value in zip(chunk, chunk_values) if value >= threshold]
+    return min(inside), max(inside)
+
+
+def bootstrap_interval(model: Callable, obs, fit: OptimizeResult, n_boot: int = 1000, N: int = 100,
+                       level: float = 0.95, seed: Optional[int] = None,
+                       processes: Optional[int] = 1, executor: Optional[Executor] = None) -> Tuple[float, float]:
+    """
+    Percentile bootstrap confidence interval, refitting the model to resampled counts in parallel.
+
+    Arguments:
+    model (Callable): Function returning the stationary distribution (e.g. stat_B or pois_model).
+    obs (array): Number of cells observed to contain n bacteria, starting from n = 1.
+    fit (OptimizeResult): Maximum likelihood fit, used as the starting value for each refit.
+    n_boot (int): Number of bootstrap samples (default is 1000).
+    N (int): Maximum number of bacteria in a cell (default is 100).
+    level (float): Confidence level (default is 0.95).
+    seed (int): Seed for the random number generator.
+    processes (int): Number of worker processes (default is 1, which runs in the current process). Any other value,
+                     including None for one per core, uses the shared pool from get_pool.
+    executor (Executor): Executor to run the work on instead, e.g. one shared across several calls.
+
+    Returns:
+    tuple: Lower and upper bounds of the interval.
+    """
+    obs = np.asarray(obs)
+    rng = np.random.default_rng(seed)
+    samples = [tuple(int(x) for x in s) for s in rng.multinomial(np.sum(obs), obs / np.sum(obs), size=n_boot)]
+    start = float(fit.x[0])
+    results = _map(_fit_one, [start] * n_boot, [model] * n_boot, [N] * n_boot, samples, processes=processes,
+                   executor=executor)
+    estimates = np.array([result.x[0] for result in results])
+    tail = (1 - level) / 2
+    return float(np.quantile(estimates, tail)), float(np.quantile(estimates, 1 - tail))